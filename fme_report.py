@@ -10,93 +10,286 @@ Usage:
     python fme_report.py
 """
 
+import functools
+import json
 import os
 import sys
-from datetime import datetime, timezone
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except ImportError:
     print("Error: 'requests' module is required. Install it with: pip install requests>=2.31.0")
     sys.exit(1)
 
+# orjson decodes multi-MB payloads several times faster than the stdlib;
+# fall back to json so requests stays the only hard dependency.
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+
+def _json(response):
+    # Raise the same RequestException subtype as Response.json() on a
+    # malformed body, so the callers' error handling still applies.
+    try:
+        return _loads(response.content)
+    except ValueError as e:
+        raise requests.exceptions.InvalidJSONError(e, response=response)
+
+# Statuses worth retrying, shared by the session's Retry policy and the
+# httpx status-retry loop in _client_get.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# httpx multiplexes the fanned-out user lookups over a single HTTP/2
+# connection instead of one TLS socket per pool slot; fall back to the
+# shared requests session when httpx (or its h2 extra) isn't installed.
+# Connection-level retries live on the transport; 429/5xx retries are
+# handled by _client_get so this path keeps the same resilience as the
+# session below.
+try:
+    import httpx
+
+    CLIENT = httpx.Client(
+        transport=httpx.HTTPTransport(
+            retries=3,
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=4, max_connections=8),
+        ),
+        timeout=httpx.Timeout(30, connect=5),
+    )
+    _HTTP_ERRORS = (requests.exceptions.RequestException, httpx.HTTPError)
+except ImportError:
+    CLIENT = None
+    _HTTP_ERRORS = (requests.exceptions.RequestException,)
+
+# Shared session so urllib3 reuses keep-alive connections (one TLS handshake
+# per host instead of one per request). Transient 5xx/429 responses are
+# retried with backoff so one blip doesn't silently drop a workspace.
+RETRIES = Retry(
+    total=5,
+    backoff_factor=0.3,
+    status_forcelist=list(RETRY_STATUSES),
+    allowed_methods=["GET"],
+    respect_retry_after_header=True,
+)
+# On-disk caches (HTTP responses and resolved user emails) live under the
+# user's cache dir rather than the working directory, so authenticated API
+# data never lands in a repo checkout.
+CACHE_DIR = os.path.expanduser("~/.cache/fme_report")
+
+# requests-cache keeps responses (with their ETags) in SQLite, so reruns
+# against an unchanged account revalidate with If-None-Match and get cheap
+# 304s instead of re-downloading every payload. Plain session otherwise.
+try:
+    from requests_cache import CachedSession
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    SESSION = CachedSession(
+        cache_name=os.path.join(CACHE_DIR, 'http_cache'),
+        backend='sqlite',
+        cache_control=True,
+        expire_after=3600,
+        # keep the API credentials out of the on-disk request records
+        ignored_parameters=["Authorization", "x-api-key"],
+    )
+except ImportError:
+    SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=RETRIES))
+SESSION.headers["Accept-Encoding"] = "gzip, deflate"
+
+# Page size for the Split.io splits endpoint
+PAGE_LIMIT = 50
+
+# (connect, read) timeout applied to every request
+REQUEST_TIMEOUT = (5, 30)
+
+# Account id captured from the environment at the start of main() so the
+# cached get_user_email only needs the user id as its key. The Split.io
+# bearer token lives on the session's default headers; Harness calls pass
+# HARNESS_HEADERS explicitly since that host wants a different scheme.
+ACCOUNT_ID = None
+HARNESS_HEADERS = {}
+
+EDT = timezone(timedelta(hours=-4))
+
+# Per-flag output templates, compiled once instead of rebuilding the shared
+# prefixes in f-strings on every iteration. The Description/Tags lines are
+# appended only when present, matching the original output.
+_FLAG_TMPL = "  [{status}] {name}\n    Owner: {owner}"
+_DESC_LINE = "\n    Description: {desc}"
+_TAGS_LINE = "\n    Tags: {tags}"
+_CREATED_LINE = "\n    Created: {created}\n"
+
 
-def get_workspaces(api_token):
+@dataclass(slots=True)
+class FlagRecord:
+    name: str
+    status: str
+    owner: str | None  # resolved up front, or filled in from owner_key at emit time
+    owner_key: str | None
+    desc: str
+    tags: str
+    created: str
+
+# Resolved emails are persisted between runs so unchanged users cost no
+# HTTP call at all on the next report. Failed lookups are not persisted,
+# so transient errors get retried next time.
+USER_CACHE_PATH = os.path.join(CACHE_DIR, "users.json")
+_user_disk_cache = {}
+
+
+def _load_user_cache():
+    global _user_disk_cache
+    try:
+        with open(USER_CACHE_PATH) as f:
+            _user_disk_cache = json.load(f)
+    except (OSError, ValueError):
+        _user_disk_cache = {}
+
+
+def _save_user_cache():
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(USER_CACHE_PATH, 'w') as f:
+            json.dump(_user_disk_cache, f)
+    except OSError:
+        pass
+
+# Places the Harness user-aggregate response may carry the email, in
+# preference order.
+EMAIL_PATHS = (
+    ('data', 'user', 'email'),
+    ('data', 'email'),
+    ('user', 'email'),
+    ('email',),
+)
+
+# jmespath checks all the candidate paths in one compiled pass; without it
+# we fall back to walking EMAIL_PATHS in Python.
+try:
+    import jmespath
+
+    _EMAIL_EXPR = jmespath.compile("data.user.email || data.email || user.email || email")
+    _LIST_EXPR = jmespath.compile("objects || data")
+except ImportError:
+    _EMAIL_EXPR = None
+    _LIST_EXPR = None
+
+
+def _dig(data, path):
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def _extract_email(user_data):
+    if _EMAIL_EXPR is not None:
+        return _EMAIL_EXPR.search(user_data)
+    return next((v for path in EMAIL_PATHS if (v := _dig(user_data, path))), None)
+
+
+def _extract_list(payload):
+    if isinstance(payload, dict):
+        if _LIST_EXPR is not None:
+            return _LIST_EXPR.search(payload) or []
+        return payload.get('objects', payload.get('data', []))
+    return payload
+
+
+def get_workspaces():
     url = "https://api.split.io/internal/api/v2/workspaces"
-    headers = {"Authorization": f"Bearer {api_token}"}
     
     try:
-        response = requests.get(url, headers=headers)
+        response = SESSION.get(url, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        return response.json()
+        return _json(response)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching workspaces: {e}", file=sys.stderr)
         sys.exit(1)
 
 
-def get_feature_flags(api_token, workspace_id):
+def get_feature_flags(workspace_id):
     url = f"https://api.split.io/internal/api/v2/splits/ws/{workspace_id}"
-    headers = {"Authorization": f"Bearer {api_token}"}
-    
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching feature flags: {e}", file=sys.stderr)
-        return []
+    flags = []
+    offset = 0
 
+    # Page through the splits list instead of pulling one giant payload, so
+    # each (gzip-compressed) response stays small.
+    while True:
+        try:
+            response = SESSION.get(url, params={"limit": PAGE_LIMIT, "offset": offset}, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            payload = _json(response)
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching feature flags: {e}", file=sys.stderr)
+            return flags
+
+        page = _extract_list(payload) or []
+        flags.extend(page)
+
+        if len(page) < PAGE_LIMIT:
+            return flags
+        offset += PAGE_LIMIT
+
+
+def _client_get(url, params):
+    # Mirror the session's Retry policy for httpx: back off on 429/5xx and
+    # honor a numeric Retry-After, returning the last response otherwise.
+    response = CLIENT.get(url, headers=HARNESS_HEADERS, params=params)
+    for attempt in range(RETRIES.total):
+        if response.status_code not in RETRY_STATUSES:
+            return response
+        retry_after = response.headers.get("Retry-After", "")
+        time.sleep(float(retry_after) if retry_after.isdigit() else 0.3 * (2 ** attempt))
+        response = CLIENT.get(url, headers=HARNESS_HEADERS, params=params)
+    return response
+
+
+@functools.lru_cache(maxsize=4096)
+def get_user_email(user_id):
+    cached = _user_disk_cache.get(user_id)
+    if cached:
+        return cached
 
-def get_user_email(api_token, user_id, account_id, user_cache):
-    if user_id in user_cache:
-        return user_cache[user_id]
-    
     url = f"https://app.harness.io/ng/api/user/aggregate/{user_id}"
-    params = {"accountIdentifier": account_id}
-    headers = {
-        "x-api-key": api_token,
-        "Harness-Account": account_id
-    }
+    # Ask for just the email so we don't download and parse the full
+    # user-aggregate payload (roles, account info, ...).
+    params = {"accountIdentifier": ACCOUNT_ID, "fields": "user.email"}
     
     try:
-        response = requests.get(url, headers=headers, params=params)
+        if CLIENT is not None:
+            response = _client_get(url, params)
+        else:
+            response = SESSION.get(url, headers=HARNESS_HEADERS, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        user_data = response.json()
-        
-        email = None
-        if 'data' in user_data and user_data['data']:
-            if isinstance(user_data['data'], dict) and 'user' in user_data['data']:
-                email = user_data['data']['user'].get('email')
-            elif isinstance(user_data['data'], dict) and 'email' in user_data['data']:
-                email = user_data['data'].get('email')
-        
-        if not email and 'user' in user_data:
-            email = user_data['user'].get('email')
-        
-        if not email and 'email' in user_data:
-            email = user_data.get('email')
-        
-        if not email:
-            email = f"ID: {user_id}"
-        
-        user_cache[user_id] = email
-        return email
-    except requests.exceptions.RequestException:
-        result = f"ID: {user_id}"
-        user_cache[user_id] = result
-        return result
+        user_data = _json(response)
+
+        email = _extract_email(user_data)
+        if email:
+            _user_disk_cache[user_id] = email
+            return email
+        return f"ID: {user_id}"
+    except _HTTP_ERRORS:
+        return f"ID: {user_id}"
 
 
 def format_timestamp_edt(timestamp_ms):
     if not timestamp_ms:
         return "N/A"
     
-    timestamp_sec = timestamp_ms / 1000
-    utc_dt = datetime.fromtimestamp(timestamp_sec, tz=timezone.utc)
-    edt_offset = -4 * 3600
-    edt_dt = datetime.fromtimestamp(timestamp_sec + edt_offset, tz=timezone.utc)
-    
-    return edt_dt.strftime("%Y-%m-%d %H:%M:%S EDT")
+    return datetime.fromtimestamp(timestamp_ms * 1e-3, EDT).strftime("%Y-%m-%d %H:%M:%S EDT")
 
 
 def main():
@@ -113,138 +306,190 @@ def main():
         print("Please set it with: export HARNESS_ACCOUNT_ID='your_account_id_here'", file=sys.stderr)
         sys.exit(1)
     
-    user_cache = {}
+    global ACCOUNT_ID, HARNESS_HEADERS
+    ACCOUNT_ID = account_id
+    HARNESS_HEADERS = {"x-api-key": api_token, "Harness-Account": account_id}
+    SESSION.headers.update({"Authorization": f"Bearer {api_token}"})
+    _load_user_cache()
+
+    # Report lines are buffered and flushed with a single write at the end so
+    # we don't pay a locked, line-buffered write per flag.
+    out = []
     total_flags = 0
-    flags_by_owner = {}
-    flags_by_workspace = {}
-    flags_by_status = {}
-    flags_by_tag = {}
+    flags_by_owner = Counter()
+    flags_by_workspace = Counter()
+    flags_by_status = Counter()
+    flags_by_tag = Counter()
     
-    print("=" * 80)
-    print("FEATURE FLAG MANAGEMENT REPORT")
-    print("Harness FME")
-    print(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S EDT')}")
-    print("=" * 80)
-    print("\nFetching workspaces from FME API...")
+    out.append("=" * 80)
+    out.append("FEATURE FLAG MANAGEMENT REPORT")
+    out.append("Harness FME")
+    out.append(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S EDT')}")
+    out.append("=" * 80)
+    out.append("\nFetching workspaces from FME API...")
     
-    workspaces = get_workspaces(api_token)
+    workspaces = get_workspaces()
     
-    if isinstance(workspaces, dict):
-        workspace_list = workspaces.get('objects', workspaces.get('data', []))
-    else:
-        workspace_list = workspaces
+    workspace_list = _extract_list(workspaces)
     
     if not workspace_list:
-        print("No workspaces found.")
+        out.append("No workspaces found.")
+        sys.stdout.write("\n".join(out) + "\n")
         return
     
-    print(f"Found {len(workspace_list)} workspace(s)\n")
-    print("=" * 80)
+    out.append(f"Found {len(workspace_list)} workspace(s)\n")
+    out.append("=" * 80)
     
-    for workspace in workspace_list:
-        name = workspace.get('name', 'N/A')
-        workspace_id = workspace.get('id', None)
-        
-        print(f"\n{'─' * 80}")
-        print(f"WORKSPACE: {name}")
-        print(f"{'─' * 80}")
-        
-        if not workspace_id:
-            print("⚠️  No workspace ID found, skipping feature flags\n")
-            continue
-        
-        feature_flags = get_feature_flags(api_token, workspace_id)
-        
-        if isinstance(feature_flags, dict):
-            ff_list = feature_flags.get('objects', feature_flags.get('data', []))
-        else:
-            ff_list = feature_flags
-        
+    # Per-workspace flag fetches are independent, so issue them concurrently
+    # and keep the printing/aggregation sequential to preserve output order.
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        workspace_results = list(pool.map(
+            lambda workspace: (
+                workspace,
+                get_feature_flags(workspace['id']) if workspace.get('id') else None,
+            ),
+            workspace_list,
+        ))
+
+    # Single pass over the raw payloads: build per-flag records, run the
+    # aggregations, and collect the owner ids that still need resolving.
+    # A second cheap pass over the records fills in the resolved emails, so
+    # the flag lists are only traversed once.
+    pending_user_ids = set()
+    sections = []
+    for workspace, feature_flags in workspace_results:
+        ff_list = _extract_list(feature_flags)
+
+        records = []
+        sections.append((workspace, records))
+
         if not ff_list:
-            print("  No feature flags found")
             continue
-        
-        flags_by_workspace[name] = len(ff_list)
-        print(f"\nFeature Flags: {len(ff_list)}\n")
-        
+
+        flags_by_workspace[workspace.get('name', 'N/A')] = len(ff_list)
+        total_flags += len(ff_list)
+
+        ws_tags = []
         for ff in ff_list:
-            total_flags += 1
-            ff_name = ff.get('name', 'N/A')
             ff_description = ff.get('description', 'No description')
-            creation_time = ff.get('creationTime', None)
             rollout_status = ff.get('rolloutStatus', {}).get('name', 'Unknown')
             tags = ff.get('tags', [])
-            
+
+            owner_str = None
+            owner_key = None
             owners = ff.get('owners', [])
             if owners and len(owners) > 0:
                 owner = owners[0]
                 owner_id = owner.get('id', '')
                 owner_type = owner.get('type', '')
-                
+
                 if owner_id and owner_type == 'user':
-                    owner_str = get_user_email(api_token, owner_id, account_id, user_cache)
+                    owner_key = owner_id
+                    pending_user_ids.add(owner_id)
                 elif owner_id:
                     owner_str = f"ID: {owner_id} (type: {owner_type})"
                 else:
                     owner_str = 'Unknown'
             else:
                 owner_str = 'No owner assigned'
-            
-            creation_time_str = format_timestamp_edt(creation_time)
-            
+
             if tags:
                 tag_names = [tag.get('name', '') for tag in tags if isinstance(tag, dict)]
                 tags_str = ', '.join(tag_names) if tag_names else 'None'
-                for tag_name in tag_names:
-                    if tag_name:
-                        flags_by_tag[tag_name] = flags_by_tag.get(tag_name, 0) + 1
+                ws_tags.extend(name for name in tag_names if name)
             else:
                 tags_str = 'None'
-            
-            flags_by_owner[owner_str] = flags_by_owner.get(owner_str, 0) + 1
-            flags_by_status[rollout_status] = flags_by_status.get(rollout_status, 0) + 1
-            
-            print(f"  [{rollout_status}] {ff_name}")
-            print(f"    Owner: {owner_str}")
-            if ff_description and ff_description != 'No description':
-                print(f"    Description: {ff_description}")
-            if tags_str != 'None':
-                print(f"    Tags: {tags_str}")
-            print(f"    Created: {creation_time_str}")
-            print()
-    
-    print("\n" + "=" * 80)
-    print("SUMMARY STATISTICS")
-    print("=" * 80)
-    
-    print(f"\n📊 OVERALL METRICS")
-    print(f"  • Total Workspaces: {len(workspace_list)}")
-    print(f"  • Total Feature Flags: {total_flags}")
+
+            records.append(FlagRecord(
+                name=ff.get('name', 'N/A'),
+                status=rollout_status,
+                owner=owner_str,
+                owner_key=owner_key,
+                desc=ff_description,
+                tags=tags_str,
+                created=format_timestamp_edt(ff.get('creationTime', None)),
+            ))
+
+        # Counter.update consumes the iterables in C, one call per workspace
+        # instead of a Python-level increment per flag/tag.
+        flags_by_status.update(rec.status for rec in records)
+        flags_by_tag.update(ws_tags)
+
+    # Owner lookups are independent round-trips to app.harness.io, so resolve
+    # every distinct owner concurrently; the emit pass below only hits cache.
+    if pending_user_ids:
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            futures = [pool.submit(get_user_email, user_id) for user_id in pending_user_ids]
+            for future in futures:
+                future.result()
+
+    for workspace, records in sections:
+        name = workspace.get('name', 'N/A')
+        workspace_id = workspace.get('id', None)
+
+        out.append(f"\n{'─' * 80}")
+        out.append(f"WORKSPACE: {name}")
+        out.append(f"{'─' * 80}")
+
+        if not workspace_id:
+            out.append("⚠️  No workspace ID found, skipping feature flags\n")
+            continue
+
+        if not records:
+            out.append("  No feature flags found")
+            continue
+
+        out.append(f"\nFeature Flags: {len(records)}\n")
+
+        for rec in records:
+            if rec.owner is None:
+                rec.owner = get_user_email(rec.owner_key)
+            flags_by_owner[rec.owner] += 1
+
+            block = _FLAG_TMPL.format(status=rec.status, name=rec.name, owner=rec.owner)
+            if rec.desc and rec.desc != 'No description':
+                block += _DESC_LINE.format(desc=rec.desc)
+            if rec.tags != 'None':
+                block += _TAGS_LINE.format(tags=rec.tags)
+            out.append(block + _CREATED_LINE.format(created=rec.created))
+    
+    out.append("\n" + "=" * 80)
+    out.append("SUMMARY STATISTICS")
+    out.append("=" * 80)
+    
+    out.append(f"\n📊 OVERALL METRICS")
+    out.append(f"  • Total Workspaces: {len(workspace_list)}")
+    out.append(f"  • Total Feature Flags: {total_flags}")
     if flags_by_workspace:
         avg_flags = total_flags / len([w for w in workspace_list if flags_by_workspace.get(w.get('name', 'N/A'), 0) > 0])
-        print(f"  • Average Flags per Workspace: {avg_flags:.1f}")
+        out.append(f"  • Average Flags per Workspace: {avg_flags:.1f}")
     
-    print(f"\n📁 FLAGS BY WORKSPACE")
-    for ws_name, count in sorted(flags_by_workspace.items(), key=lambda x: x[1], reverse=True):
-        print(f"  • {ws_name}: {count} flags")
+    out.append(f"\n📁 FLAGS BY WORKSPACE")
+    for ws_name, count in flags_by_workspace.most_common():
+        out.append(f"  • {ws_name}: {count} flags")
     
-    print(f"\n👤 TOP FLAG OWNERS")
-    sorted_owners = sorted(flags_by_owner.items(), key=lambda x: x[1], reverse=True)
-    for owner, count in sorted_owners[:10]:
-        print(f"  • {owner}: {count} flags")
+    out.append(f"\n👤 TOP FLAG OWNERS")
+    for owner, count in flags_by_owner.most_common(10):
+        out.append(f"  • {owner}: {count} flags")
     
-    print(f"\n🚦 FLAGS BY ROLLOUT STATUS")
-    for status, count in sorted(flags_by_status.items(), key=lambda x: x[1], reverse=True):
-        print(f"  • {status}: {count} flags ({count/total_flags*100:.1f}%)")
+    out.append(f"\n🚦 FLAGS BY ROLLOUT STATUS")
+    for status, count in flags_by_status.most_common():
+        out.append(f"  • {status}: {count} flags ({count/total_flags*100:.1f}%)")
     
     if flags_by_tag:
-        print(f"\n🏷️  FLAGS BY TAG")
-        for tag, count in sorted(flags_by_tag.items(), key=lambda x: x[1], reverse=True):
-            print(f"  • {tag}: {count} flags")
+        out.append(f"\n🏷️  FLAGS BY TAG")
+        for tag, count in flags_by_tag.most_common():
+            out.append(f"  • {tag}: {count} flags")
     
-    print("\n" + "=" * 80)
-    print("END OF REPORT")
-    print("=" * 80)
+    out.append("\n" + "=" * 80)
+    out.append("END OF REPORT")
+    out.append("=" * 80)
+
+    sys.stdout.write("\n".join(out) + "\n")
+    _save_user_cache()
+    if CLIENT is not None:
+        CLIENT.close()
+    SESSION.close()
 
 
 if __name__ == "__main__":